@@ -2,8 +2,8 @@ import threading
 import logging
 from flask import Flask, render_template_string
 from flask_socketio import SocketIO
-from config import CLIENT_NAME, FLASK_WEB_PORT, client_sockets
-from database import initialize_database, get_last_block_hash, get_ledger_blocks, get_ledger_blocks_before
+from config import CLIENT_NAME, FLASK_WEB_PORT, COMPACT_INTERVAL, client_sockets
+from database import initialize_database, get_last_block_hash, get_ledger_blocks, get_ledger_blocks_before, compact_ledger, periodic_ledger_compaction
 from blockchain import calculate_hash, broadcast_block_to_peers, validate_chain
 from utils import get_utc_timestamp, convert_utc_to_local, safe_emit, set_socketio
 from peer_discovery import start_tcp_server, connect_to_peers, periodic_ledger_sync
@@ -72,6 +72,9 @@ def handle_check_new_messages():
 
 if __name__ == "__main__":
     initialize_database()
+    if COMPACT_INTERVAL > 0:
+        compact_ledger()
+        threading.Thread(target=periodic_ledger_compaction, daemon=True).start()
     if not validate_chain():
         logging.warning("[Startup] Local chain invalid. Sync may be needed.")
     threading.Thread(target=start_tcp_server, daemon=True).start()
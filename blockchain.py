@@ -5,6 +5,7 @@ from datetime import datetime
 from sqlalchemy import text
 from config import engine
 from utils import convert_utc_to_local
+from cold_storage import cold_store
 
 def calculate_hash(sender, timestamp, message, prev_hash=""):
     return hashlib.sha256(f"{sender}{timestamp}{message}{prev_hash}".encode()).hexdigest()
@@ -16,7 +17,7 @@ def handle_new_block(block_json, safe_emit):
         if calc_hash == block["hash"]:
             with engine.connect() as conn:
                 result = conn.execute(text("SELECT COUNT(*) FROM ledger WHERE hash = :h"), {"h": block["hash"]})
-                if result.fetchone()[0] == 0:
+                if result.fetchone()[0] == 0 and not cold_store.contains(block["hash"], block["timestamp"]):
                     conn.execute(
                         text("INSERT INTO messages (sender, timestamp, message) VALUES (:sender, :timestamp, :message)"),
                         {"sender": block["sender"], "timestamp": block["timestamp"], "message": block["message"]}
@@ -44,14 +45,32 @@ def broadcast_block_to_peers(block_data, client_sockets):
 
 def validate_chain():
     try:
-        with engine.connect() as conn:
-            result = conn.execute(text("SELECT id, sender, timestamp, message, prev_hash, hash FROM ledger ORDER BY id ASC")).mappings().all()
+        with cold_store.lock:
             prev_hash = "0"
-            for b in result:
-                timestamp_str = b["timestamp"].strftime("%Y-%m-%d %H:%M:%S") if isinstance(b["timestamp"], datetime) else str(b["timestamp"])
-                if b["prev_hash"] != prev_hash or calculate_hash(b["sender"], timestamp_str, b["message"], b["prev_hash"]) != b["hash"]:
+            # Segments are immutable, so each one is fully re-hashed only once per process
+            for seg in cold_store.segments():
+                if seg["first_prev_hash"] != prev_hash:
                     return False
-                prev_hash = b["hash"]
+                if not cold_store.is_verified(seg):
+                    if not cold_store.verify_checksum(seg):
+                        logging.error(f"[Cold Error] Checksum mismatch in {seg['file']}")
+                        return False
+                    for b in cold_store.iter_segment(seg):
+                        if b["prev_hash"] != prev_hash or calculate_hash(b["sender"], b["timestamp"], b["message"], b["prev_hash"]) != b["hash"]:
+                            return False
+                        prev_hash = b["hash"]
+                    if prev_hash != seg["last_hash"]:
+                        return False
+                    cold_store.mark_verified(seg)
+                prev_hash = seg["last_hash"]
+
+            with engine.connect() as conn:
+                result = conn.execute(text("SELECT id, sender, timestamp, message, prev_hash, hash FROM ledger ORDER BY id ASC")).mappings()
+                for b in result:
+                    timestamp_str = b["timestamp"].strftime("%Y-%m-%d %H:%M:%S") if isinstance(b["timestamp"], datetime) else str(b["timestamp"])
+                    if b["prev_hash"] != prev_hash or calculate_hash(b["sender"], timestamp_str, b["message"], b["prev_hash"]) != b["hash"]:
+                        return False
+                    prev_hash = b["hash"]
         return True
     except:
         return False
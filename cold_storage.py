@@ -0,0 +1,294 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime
+from config import COLD_STORAGE_DIR, SEGMENT_FRAME_BLOCKS
+
+# Segment layout: MAGIC | zlib frame * N | JSON index | footer(index length, index crc32, MAGIC)
+SEGMENT_MAGIC = b"EYLSEG01"
+SEGMENT_FOOTER = struct.Struct("<II8s")
+# The index keeps a short prefix of every block hash so lookups only decompress candidate frames
+HASH_PREFIX_CHARS = 16
+MANIFEST_NAME = "manifest.json"
+BLOCK_FIELDS = ("sender", "timestamp", "message", "prev_hash", "hash")
+
+
+def normalize_timestamp(ts):
+    """Render a ledger timestamp as the 'YYYY-MM-DD HH:MM:SS' string used for hashing"""
+    if isinstance(ts, datetime):
+        return ts.strftime("%Y-%m-%d %H:%M:%S")
+    return str(ts).replace("T", " ")[:19]
+
+
+class ColdStore:
+    """Immutable, compressed ledger segments holding the oldest part of the chain.
+
+    Heights are global chain positions: cold segments cover heights
+    [0, count) contiguously and the hot `ledger` table continues from there.
+    """
+
+    def __init__(self, directory, frame_blocks=SEGMENT_FRAME_BLOCKS):
+        self.directory = directory
+        self.frame_blocks = max(1, frame_blocks)
+        # Held by readers spanning both tiers and by compaction while it moves blocks
+        self.lock = threading.RLock()
+        self._segments = []
+        self._open_segments = {}
+        self._verified = set()
+        self._load_manifest()
+
+    # ------------------------ Manifest ------------------------ #
+    def _manifest_path(self):
+        return os.path.join(self.directory, MANIFEST_NAME)
+
+    def _load_manifest(self):
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                self._segments = json.load(f).get("segments", [])
+            logging.info(f"[Cold] Loaded {len(self._segments)} segments ({self.count} blocks)")
+        except FileNotFoundError:
+            self._segments = []
+        except Exception as e:
+            self._segments = []
+            logging.error(f"[Cold Error] Failed to load manifest: {e}")
+
+    def publish(self, entry):
+        """Atomically append a written segment to the manifest"""
+        with self.lock:
+            if entry["first_height"] != self.count:
+                raise ValueError(f"segment starts at height {entry['first_height']}, expected {self.count}")
+            segments = self._segments + [entry]
+            tmp_path = self._manifest_path() + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"segments": segments}, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._manifest_path())
+            self._segments = segments
+            self._verified.add(entry["file"])
+
+    # ------------------------ Summary ------------------------ #
+    def segments(self):
+        return list(self._segments)
+
+    @property
+    def count(self):
+        return sum(seg["count"] for seg in self._segments)
+
+    def last_hash(self):
+        return self._segments[-1]["last_hash"] if self._segments else None
+
+    def max_timestamp(self):
+        return max((seg["max_ts"] for seg in self._segments), default=None)
+
+    # ------------------------ Writing ------------------------ #
+    def write_segment(self, blocks, first_height):
+        """Write blocks (chain order) to a new segment file and return its manifest entry"""
+        os.makedirs(self.directory, exist_ok=True)
+        last_height = first_height + len(blocks) - 1
+        file_name = f"segment-{first_height:012d}-{last_height:012d}.seg"
+        path = os.path.join(self.directory, file_name)
+        tmp_path = path + ".tmp"
+        blocks = [{field: block[field] for field in BLOCK_FIELDS} for block in blocks]
+        for block in blocks:
+            block["timestamp"] = normalize_timestamp(block["timestamp"])
+
+        digest = hashlib.sha256()
+        frames = []
+        with open(tmp_path, "wb") as f:
+            def write(data):
+                f.write(data)
+                digest.update(data)
+
+            write(SEGMENT_MAGIC)
+            offset = len(SEGMENT_MAGIC)
+            for i in range(0, len(blocks), self.frame_blocks):
+                chunk = blocks[i:i + self.frame_blocks]
+                lines = "\n".join(json.dumps(b, separators=(",", ":")) for b in chunk)
+                payload = zlib.compress(lines.encode("utf-8"), 9)
+                write(payload)
+                timestamps = [b["timestamp"] for b in chunk]
+                frames.append({
+                    "offset": offset,
+                    "length": len(payload),
+                    "crc32": zlib.crc32(payload),
+                    "first_height": first_height + i,
+                    "count": len(chunk),
+                    "min_ts": min(timestamps),
+                    "max_ts": max(timestamps),
+                    "last_hash": chunk[-1]["hash"]
+                })
+                offset += len(payload)
+
+            index = json.dumps({
+                "first_height": first_height,
+                "frames": frames,
+                "hashes": [b["hash"][:HASH_PREFIX_CHARS] for b in blocks]
+            }, separators=(",", ":")).encode("utf-8")
+            write(index)
+            write(SEGMENT_FOOTER.pack(len(index), zlib.crc32(index), SEGMENT_MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        return {
+            "file": file_name,
+            "first_height": first_height,
+            "count": len(blocks),
+            "first_prev_hash": blocks[0]["prev_hash"],
+            "last_hash": blocks[-1]["hash"],
+            "min_ts": min(frame["min_ts"] for frame in frames),
+            "max_ts": max(frame["max_ts"] for frame in frames),
+            "sha256": digest.hexdigest()
+        }
+
+    # ------------------------ Reading ------------------------ #
+    def _open(self, seg):
+        """Map a segment and parse its index: (mmap, frames, hash prefix -> heights)"""
+        with self.lock:
+            cached = self._open_segments.get(seg["file"])
+            if cached:
+                return cached
+            with open(os.path.join(self.directory, seg["file"]), "rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            index_length, index_crc, magic = SEGMENT_FOOTER.unpack(mm[-SEGMENT_FOOTER.size:])
+            if magic != SEGMENT_MAGIC or mm[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+                raise ValueError(f"{seg['file']} is not a ledger segment")
+            raw_index = mm[-SEGMENT_FOOTER.size - index_length:-SEGMENT_FOOTER.size]
+            if zlib.crc32(raw_index) != index_crc:
+                raise ValueError(f"{seg['file']} has a corrupt index")
+            index = json.loads(raw_index)
+            # Prefixes can collide (and peers choose message content), so keep every height
+            hash_heights = {}
+            for i, prefix in enumerate(index["hashes"]):
+                hash_heights.setdefault(prefix, []).append(index["first_height"] + i)
+            self._open_segments[seg["file"]] = (mm, index["frames"], hash_heights)
+            return self._open_segments[seg["file"]]
+
+    def _read_frame(self, seg, frame):
+        mm = self._open(seg)[0]
+        payload = mm[frame["offset"]:frame["offset"] + frame["length"]]
+        if zlib.crc32(payload) != frame["crc32"]:
+            raise ValueError(f"{seg['file']} frame at height {frame['first_height']} failed its checksum")
+        return [json.loads(line) for line in zlib.decompress(payload).decode("utf-8").split("\n")]
+
+    def _frames(self):
+        return [(seg, frame) for seg in self._segments for frame in self._open(seg)[1]]
+
+    def verify_checksum(self, seg):
+        mm = self._open(seg)[0]
+        return hashlib.sha256(mm).hexdigest() == seg["sha256"]
+
+    def is_verified(self, seg):
+        return seg["file"] in self._verified
+
+    def mark_verified(self, seg):
+        self._verified.add(seg["file"])
+
+    def iter_segment(self, seg):
+        for frame in self._open(seg)[1]:
+            yield from self._read_frame(seg, frame)
+
+    def iter_blocks(self, start_height=0):
+        """Yield blocks in chain order starting at a global height"""
+        for seg in self._segments:
+            if seg["first_height"] + seg["count"] <= start_height:
+                continue
+            for frame in self._open(seg)[1]:
+                if frame["first_height"] + frame["count"] <= start_height:
+                    continue
+                skip = max(0, start_height - frame["first_height"])
+                yield from self._read_frame(seg, frame)[skip:]
+
+    def _segment_at(self, height):
+        for seg in self._segments:
+            if seg["first_height"] <= height < seg["first_height"] + seg["count"]:
+                return seg
+        return None
+
+    def block_at(self, height):
+        """Archived block at a global height, decompressing only its frame"""
+        seg = self._segment_at(height)
+        if seg is None:
+            return None
+        for frame in self._open(seg)[1]:
+            if frame["first_height"] <= height < frame["first_height"] + frame["count"]:
+                return self._read_frame(seg, frame)[height - frame["first_height"]]
+        return None
+
+    def find_height(self, block_hash, prev_hash=None, height_hint=None):
+        """Height of an archived block by hash, probing the footer hash indexes"""
+        if height_hint is not None and 0 <= height_hint < self.count:
+            block = self.block_at(height_hint)
+            if block["hash"] == block_hash and (prev_hash is None or block["prev_hash"] == prev_hash):
+                return height_hint
+        for seg in reversed(self._segments):
+            for height in self._open(seg)[2].get(block_hash[:HASH_PREFIX_CHARS], []):
+                block = self.block_at(height)
+                if block["hash"] == block_hash and (prev_hash is None or block["prev_hash"] == prev_hash):
+                    return height
+        return None
+
+    def contains(self, block_hash, timestamp):
+        """Whether a block is archived; the timestamp narrows the probe to segments covering it"""
+        ts = normalize_timestamp(timestamp)
+        for seg in self._segments:
+            if not seg["min_ts"] <= ts <= seg["max_ts"]:
+                continue
+            for height in self._open(seg)[2].get(block_hash[:HASH_PREFIX_CHARS], []):
+                if self.block_at(height)["hash"] == block_hash:
+                    return True
+        return False
+
+    def oldest_blocks(self, limit):
+        """Oldest `limit` archived blocks, ascending by (timestamp, height)"""
+        frames = self._frames()
+        # Mirror of blocks_before: the running min from the end tells us when
+        # newer frames can no longer contribute.
+        suffix_min, running = [], None
+        for _, frame in reversed(frames):
+            running = frame["min_ts"] if running is None else min(running, frame["min_ts"])
+            suffix_min.append(running)
+        suffix_min.reverse()
+
+        candidates = []
+        for i, (seg, frame) in enumerate(frames):
+            if len(candidates) >= limit and suffix_min[i] > candidates[limit - 1][0][0]:
+                break
+            for offset, block in enumerate(self._read_frame(seg, frame)):
+                candidates.append(((block["timestamp"], frame["first_height"] + offset), block))
+            candidates.sort(key=lambda c: c[0])
+            del candidates[limit:]
+        return [block for _, block in candidates]
+
+    def blocks_before(self, before_timestamp, limit):
+        """Newest `limit` archived blocks older than a timestamp, ascending by (timestamp, height)"""
+        before = normalize_timestamp(before_timestamp)
+        frames = self._frames()
+        # Timestamps are not strictly monotonic along the chain, so track the
+        # running max to know when older frames can no longer contribute.
+        prefix_max, running = [], ""
+        for _, frame in frames:
+            running = max(running, frame["max_ts"])
+            prefix_max.append(running)
+
+        candidates = []
+        for i in range(len(frames) - 1, -1, -1):
+            if len(candidates) >= limit and prefix_max[i] < candidates[-limit][0][0]:
+                break
+            seg, frame = frames[i]
+            if frame["min_ts"] >= before:
+                continue
+            for offset, block in enumerate(self._read_frame(seg, frame)):
+                if block["timestamp"] < before:
+                    candidates.append(((block["timestamp"], frame["first_height"] + offset), block))
+            candidates.sort(key=lambda c: c[0])
+        return [block for _, block in candidates[-limit:]]
+
+
+cold_store = ColdStore(COLD_STORAGE_DIR)
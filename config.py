@@ -25,6 +25,15 @@ SYNC_INTERVAL = int(os.getenv("SYNC_INTERVAL", 30))
 MAX_CLIENTS = int(os.getenv("MAX_CLIENTS", 10))
 BATCH_SIZE = int(os.getenv("SYNC_BATCH_SIZE", 50))
 
+# Cold storage (ledger compaction)
+COLD_STORAGE_DIR = os.getenv("COLD_STORAGE_DIR", "cold_storage")
+COMPACT_INTERVAL = int(os.getenv("COMPACT_INTERVAL", 3600))  # 0 disables compaction
+COMPACT_KEEP_BLOCKS = int(os.getenv("COMPACT_KEEP_BLOCKS", 1000))  # newest blocks kept hot, 0 disables the height rule
+COMPACT_MAX_AGE_DAYS = int(os.getenv("COMPACT_MAX_AGE_DAYS", 0))  # 0 disables the age rule
+SEGMENT_MIN_BLOCKS = int(os.getenv("SEGMENT_MIN_BLOCKS", 100))
+SEGMENT_MAX_BLOCKS = int(os.getenv("SEGMENT_MAX_BLOCKS", 10000))
+SEGMENT_FRAME_BLOCKS = int(os.getenv("SEGMENT_FRAME_BLOCKS", 256))
+
 # User timezone
 USER_TIMEZONE = os.getenv("USER_TIMEZONE", "Asia/Kolkata")
 
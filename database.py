@@ -1,8 +1,13 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from itertools import islice
 import logging
+import time
 from sqlalchemy import text
-from config import engine, USER_TIMEZONE
+from config import (engine, USER_TIMEZONE, COMPACT_INTERVAL, COMPACT_KEEP_BLOCKS, COMPACT_MAX_AGE_DAYS,
+                    SEGMENT_MIN_BLOCKS, SEGMENT_MAX_BLOCKS)
 from utils import convert_utc_to_local
+from blockchain import calculate_hash
+from cold_storage import cold_store, normalize_timestamp
 
 def initialize_database():
     try:
@@ -29,23 +34,44 @@ def initialize_database():
             """))
             conn.commit()
             logging.info("[DB] Tables initialized successfully")
+        _reconcile_cold_storage()
     except Exception as e:
         logging.error(f"[DB Error] Failed to initialize database: {e}")
 
+def _display_block(block):
+    utc_ts = normalize_timestamp(block["timestamp"])
+    return {
+        "sender": block["sender"],
+        "timestamp": utc_ts,
+        "display_timestamp": convert_utc_to_local(utc_ts),
+        "message": block["message"],
+        "prev_hash": block["prev_hash"],
+        "hash": block["hash"]
+    }
+
+def _chain_block(block):
+    return {
+        "sender": block["sender"],
+        "timestamp": normalize_timestamp(block["timestamp"]),
+        "message": block["message"],
+        "prev_hash": block["prev_hash"],
+        "hash": block["hash"]
+    }
+
 def get_last_block_hash():
     try:
         with engine.connect() as conn:
             result = conn.execute(text("SELECT TOP 1 hash FROM ledger ORDER BY id DESC"))
             row = result.fetchone()
-            return row[0] if row else "0"
+            return row[0] if row else (cold_store.last_hash() or "0")
     except:
         return "0"
 
 def get_ledger_count():
     try:
-        with engine.connect() as conn:
+        with cold_store.lock, engine.connect() as conn:
             result = conn.execute(text("SELECT COUNT(*) as count FROM ledger"))
-            return result.fetchone()[0]
+            return result.fetchone()[0] + cold_store.count
     except:
         return 0
 
@@ -53,27 +79,25 @@ def get_ledger_blocks(start_index=0, limit=100):
     try:
         start_index = max(0, start_index)
         limit = max(1, limit)
-        with engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT sender, timestamp, message, prev_hash, hash
-                FROM ledger
-                ORDER BY timestamp ASC, id ASC
-                OFFSET :start_index ROWS
-                FETCH NEXT :limit ROWS ONLY
-            """), {"start_index": start_index, "limit": limit}).mappings().all()
-            blocks = []
-            for row in result:
-                ts = row["timestamp"]
-                utc_ts = ts.strftime("%Y-%m-%d %H:%M:%S") if isinstance(ts, datetime) else ts
-                blocks.append({
-                    "sender": row["sender"],
-                    "timestamp": utc_ts,
-                    "display_timestamp": convert_utc_to_local(utc_ts),
-                    "message": row["message"],
-                    "prev_hash": row["prev_hash"],
-                    "hash": row["hash"]
-                })
-            return blocks
+        with cold_store.lock:
+            archived_count = cold_store.count
+            # With an archive the page has to be merged, so fetch the whole window from each tier
+            hot_offset = 0 if archived_count else start_index
+            window = start_index + limit - hot_offset
+            with engine.connect() as conn:
+                result = conn.execute(text("""
+                    SELECT sender, timestamp, message, prev_hash, hash
+                    FROM ledger
+                    ORDER BY timestamp ASC, id ASC
+                    OFFSET :start_index ROWS
+                    FETCH NEXT :limit ROWS ONLY
+                """), {"start_index": hot_offset, "limit": window}).mappings().all()
+            blocks = [_display_block(row) for row in result]
+            if archived_count:
+                archived = [_display_block(b) for b in cold_store.oldest_blocks(window)]
+                # Stable sort keeps archived blocks ahead of hot ones on equal timestamps
+                blocks = sorted(archived + blocks, key=lambda b: b["timestamp"])[start_index:]
+            return blocks[:limit]
     except Exception as e:
         logging.error(f"[DB Error] get_ledger_blocks: {e}")
         return []
@@ -81,28 +105,157 @@ def get_ledger_blocks(start_index=0, limit=100):
 def get_ledger_blocks_before(before_timestamp, limit=20):
     try:
         limit = max(1, limit)
-        with engine.connect() as conn:
-            result = conn.execute(text("""
-                SELECT sender, timestamp, message, prev_hash, hash
-                FROM ledger
-                WHERE timestamp < :before_timestamp
-                ORDER BY timestamp DESC, id DESC
-                OFFSET 0 ROWS
-                FETCH NEXT :limit ROWS ONLY
-            """), {"before_timestamp": before_timestamp, "limit": limit}).mappings().all()
-            blocks = []
-            for row in result:
-                ts = row["timestamp"]
-                utc_ts = ts.strftime("%Y-%m-%d %H:%M:%S") if isinstance(ts, datetime) else ts
-                blocks.append({
-                    "sender": row["sender"],
-                    "timestamp": utc_ts,
-                    "display_timestamp": convert_utc_to_local(utc_ts),
-                    "message": row["message"],
-                    "prev_hash": row["prev_hash"],
-                    "hash": row["hash"]
-                })
-            return list(reversed(blocks))
+        with cold_store.lock:
+            with engine.connect() as conn:
+                result = conn.execute(text("""
+                    SELECT sender, timestamp, message, prev_hash, hash
+                    FROM ledger
+                    WHERE timestamp < :before_timestamp
+                    ORDER BY timestamp DESC, id DESC
+                    OFFSET 0 ROWS
+                    FETCH NEXT :limit ROWS ONLY
+                """), {"before_timestamp": before_timestamp, "limit": limit}).mappings().all()
+            blocks = [_display_block(row) for row in reversed(result)]
+            cold_max_ts = cold_store.max_timestamp()
+            if cold_max_ts is not None and (len(blocks) < limit or blocks[0]["timestamp"] <= cold_max_ts):
+                archived = [_display_block(b) for b in cold_store.blocks_before(before_timestamp, limit)]
+                # Stable sort keeps archived blocks ahead of hot ones on equal timestamps
+                blocks = sorted(archived + blocks, key=lambda b: b["timestamp"])[-limit:]
+            return blocks
     except Exception as e:
         logging.error(f"[DB Error] get_ledger_blocks_before: {e}")
         return []
+
+# ------------------------ Chain Reads (hot + cold) ------------------------ #
+def _read_chain(start_height, limit):
+    # Both tiers are read in chain (id) order so a height means the same block wherever it lives
+    start_height = max(0, start_height)
+    limit = max(1, limit)
+    with cold_store.lock:
+        cold_count = cold_store.count
+        blocks = []
+        if start_height < cold_count:
+            blocks = list(islice(cold_store.iter_blocks(start_height), limit))
+        if len(blocks) < limit:
+            with engine.connect() as conn:
+                result = conn.execute(text("""
+                    SELECT sender, timestamp, message, prev_hash, hash
+                    FROM ledger
+                    ORDER BY id ASC
+                    OFFSET :start_index ROWS
+                    FETCH NEXT :limit ROWS ONLY
+                """), {"start_index": max(0, start_height - cold_count), "limit": limit - len(blocks)}).mappings().all()
+                blocks.extend(result)
+    return blocks
+
+def find_block_height(block_hash, prev_hash, height_hint=None):
+    """Global chain height of a block, -1 for the genesis marker, or None if it is in neither tier"""
+    if block_hash == "0" and prev_hash == "0":
+        return -1
+    try:
+        with cold_store.lock:
+            with engine.connect() as conn:
+                position = conn.execute(text("""
+                    SELECT COUNT(*) FROM ledger
+                    WHERE id <= (SELECT id FROM ledger WHERE hash = :h AND prev_hash = :p)
+                """), {"h": block_hash, "p": prev_hash}).fetchone()[0]
+            if position:
+                return cold_store.count + position - 1
+            return cold_store.find_height(block_hash, prev_hash, height_hint)
+    except Exception as e:
+        logging.error(f"[DB Error] find_block_height: {e}")
+        return None
+
+def get_chain_blocks(start_height=0, limit=100):
+    """Blocks in chain (insertion) order from a global height, without display fields"""
+    try:
+        return [_chain_block(b) for b in _read_chain(start_height, limit)]
+    except Exception as e:
+        logging.error(f"[DB Error] get_chain_blocks: {e}")
+        return []
+
+# ------------------------ Cold Storage Compaction ------------------------ #
+def _reconcile_cold_storage():
+    # A crash between publishing a segment and trimming the hot table leaves
+    # archived rows behind; drop everything up to the archived tail.
+    last_hash = cold_store.last_hash()
+    if not last_hash:
+        return
+    with cold_store.lock, engine.connect() as conn:
+        row = conn.execute(text("SELECT id FROM ledger WHERE hash = :h"), {"h": last_hash}).fetchone()
+        if row:
+            conn.execute(text("DELETE FROM ledger WHERE id <= :id"), {"id": row[0]})
+            conn.commit()
+            logging.warning(f"[Compaction] Removed hot blocks already archived up to id {row[0]}")
+
+def _compaction_cutoff_id(conn):
+    newest_id = conn.execute(text("SELECT MAX(id) FROM ledger")).fetchone()[0]
+    if newest_id is None:
+        return None
+    cutoffs = []
+    if COMPACT_KEEP_BLOCKS > 0:
+        row = conn.execute(text("""
+            SELECT id FROM ledger
+            ORDER BY id DESC
+            OFFSET :keep ROWS
+            FETCH NEXT 1 ROWS ONLY
+        """), {"keep": COMPACT_KEEP_BLOCKS}).fetchone()
+        if row:
+            cutoffs.append(row[0])
+    if COMPACT_MAX_AGE_DAYS > 0:
+        cutoff_ts = (datetime.now(timezone.utc) - timedelta(days=COMPACT_MAX_AGE_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+        first_recent_id = conn.execute(text("SELECT MIN(id) FROM ledger WHERE timestamp >= :cutoff"),
+                                       {"cutoff": cutoff_ts}).fetchone()[0]
+        cutoffs.append(first_recent_id - 1 if first_recent_id is not None else newest_id)
+    if not cutoffs:
+        return None
+    # The newest block always stays hot so new blocks keep chaining off the table
+    return min(max(cutoffs), newest_id - 1)
+
+def compact_ledger():
+    """Move the oldest eligible ledger blocks into cold storage segments"""
+    try:
+        _reconcile_cold_storage()
+        while True:
+            with engine.connect() as conn:
+                last_id = _compaction_cutoff_id(conn)
+                if last_id is None:
+                    return
+                rows = conn.execute(text("""
+                    SELECT id, sender, timestamp, message, prev_hash, hash
+                    FROM ledger
+                    WHERE id <= :last_id
+                    ORDER BY id ASC
+                    OFFSET 0 ROWS
+                    FETCH NEXT :limit ROWS ONLY
+                """), {"last_id": last_id, "limit": SEGMENT_MAX_BLOCKS}).mappings().all()
+            if len(rows) < max(1, SEGMENT_MIN_BLOCKS):
+                return
+
+            blocks = [_chain_block(row) for row in rows]
+            prev_hash = cold_store.last_hash() or "0"
+            for b in blocks:
+                if b["prev_hash"] != prev_hash or calculate_hash(b["sender"], b["timestamp"], b["message"], b["prev_hash"]) != b["hash"]:
+                    logging.warning("[Compaction] Hot chain does not extend the archive. Skipping compaction until it is repaired.")
+                    return
+                prev_hash = b["hash"]
+
+            entry = cold_store.write_segment(blocks, cold_store.count)
+            with cold_store.lock:
+                cold_store.publish(entry)
+                try:
+                    with engine.connect() as conn:
+                        conn.execute(text("DELETE FROM ledger WHERE id <= :id"), {"id": rows[-1]["id"]})
+                        conn.commit()
+                except Exception as e:
+                    # The segment is already published; trim now rather than double counting until the next run
+                    logging.error(f"[Compaction Error] Failed to trim archived blocks: {e}")
+                    _reconcile_cold_storage()
+            logging.info(f"[Compaction] Archived {entry['count']} blocks to {entry['file']}")
+    except Exception as e:
+        logging.error(f"[Compaction Error] {e}")
+
+def periodic_ledger_compaction():
+    while True:
+        time.sleep(COMPACT_INTERVAL)
+        compact_ledger()
@@ -3,12 +3,12 @@ import threading
 import time
 import logging
 import json
-from datetime import datetime
 from sqlalchemy import text
 from blockchain import validate_chain, handle_new_block
 from utils import safe_emit, get_utc_timestamp, convert_utc_to_local
 from config import TCP_SERVER_PORT, PEER_LIST, MAX_RETRIES, RETRY_DELAY, SYNC_INTERVAL, client_semaphore, client_sockets
-from database import get_ledger_count, get_ledger_blocks, get_last_block_hash, engine
+from database import get_ledger_count, get_ledger_blocks, get_last_block_hash, find_block_height, get_chain_blocks, engine
+from cold_storage import cold_store
 
 BATCH_SIZE = 50  # number of blocks to sync per batch
 
@@ -163,7 +163,7 @@ def request_ledger_sync():
         last_hash = "0"
         last_prev_hash = "0"
     else:
-        last_block = get_ledger_blocks(max(0, local_count - 1), 1)
+        last_block = get_chain_blocks(local_count - 1, 1)
         last_hash = last_block[0]["hash"] if last_block else "0"
         last_prev_hash = last_block[0]["prev_hash"] if last_block else "0"
 
@@ -195,37 +195,18 @@ def handle_sync_request(conn, payload_json):
             logging.info(f"[Sync] Peer up-to-date. Sent empty response.")
             return
 
-        missing_blocks = []
-        with engine.connect() as conn_db:
-            result = conn_db.execute(text("""
-                SELECT sender, timestamp, message, prev_hash, hash
-                FROM ledger
-                ORDER BY id ASC
-            """)).mappings().all()
-
-            start_index = 0
-            for i, b in enumerate(result):
-                if b["hash"] == peer_last_hash and b["prev_hash"] == peer_last_prev:
-                    start_index = i + 1
-                    break
-
-            prev_hash = peer_last_hash
-            end_index = min(len(result), start_index + BATCH_SIZE)
+        # Heights are global across the hot table and cold segments, so
+        # archived ranges are served straight from the segment files.
+        height = find_block_height(peer_last_hash, peer_last_prev, peer_count - 1)
+        start_index = height + 1 if height is not None else 0
 
-            for b in result[start_index:end_index]:
-                if b["prev_hash"] != prev_hash:
-                    break
-                ts = b["timestamp"]
-                if isinstance(ts, datetime):
-                    ts = ts.strftime("%Y-%m-%d %H:%M:%S")
-                missing_blocks.append({
-                    "sender": b["sender"],
-                    "timestamp": ts,
-                    "message": b["message"],
-                    "prev_hash": b["prev_hash"],
-                    "hash": b["hash"]
-                })
-                prev_hash = b["hash"]
+        missing_blocks = []
+        prev_hash = peer_last_hash
+        for b in get_chain_blocks(start_index, BATCH_SIZE):
+            if b["prev_hash"] != prev_hash:
+                break
+            missing_blocks.append(b)
+            prev_hash = b["hash"]
 
         response_data = {"blocks": missing_blocks, "total_count": local_count}
         conn.send(f"SYNC_RESPONSE:{json.dumps(response_data)}\n".encode())
@@ -251,7 +232,7 @@ def handle_sync_response(response_json):
                     text("SELECT COUNT(*) FROM ledger WHERE hash = :h"),
                     {"h": block["hash"]}
                 ).fetchone()[0]
-                if exists == 0:
+                if exists == 0 and not cold_store.contains(block["hash"], block["timestamp"]):
                     conn.execute(
                         text("INSERT INTO messages (sender, timestamp, message) VALUES (:sender, :timestamp, :message)"),
                         {"sender": block["sender"], "timestamp": block["timestamp"], "message": block["message"]}